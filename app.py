@@ -27,6 +27,9 @@ from datetime import datetime  # Import datetime for timestamps
 import mysql.connector  # MySQL connection
 from mysql.connector import Error  # MySQL error handling
 from urllib.parse import quote  # Import quote to handle special characters in password
+from autocomplete import autocomplete_index, init_autocomplete, build_autocomplete_index  # In-memory name autocomplete
+import os  # Snapshot directory path
+import click  # CLI output for the snapshot command
 <<<<<<< HEAD
 from werkzeug.security import generate_password_hash, check_password_hash # Hashing and checking passwords
 
@@ -197,6 +200,7 @@ class Client(db.Model):
     address = db.Column(db.String(255), nullable=False)
     zip_code = db.Column(db.String(10), nullable=True)
     email = db.Column(db.String(100))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)  # Used by the snapshot job
     packages = db.relationship('Package', backref='client', lazy=True)
 
 
@@ -215,6 +219,7 @@ class Recipient(db.Model):
     municipality = db.Column(db.String(100))
     province = db.Column(db.String(100))
     province_code = db.Column(db.String(10), nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)  # Used by the snapshot job
     packages = db.relationship('Package', backref='recipient', lazy=True)
 
 
@@ -232,6 +237,25 @@ class Package(db.Model):
     miscellaneous = db.Column(db.String(255))
     client_id = db.Column(db.Integer, db.ForeignKey('clients.id'), nullable=False)
     recipient_id = db.Column(db.Integer, db.ForeignKey('recipients.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)  # Used by the snapshot job
+
+# Keep the autocomplete index in sync with client and recipient changes
+init_autocomplete(Client, Recipient)
+
+# Local package snapshot used for reports, refreshed with `flask snapshot-packages`
+app.config.setdefault('SNAPSHOT_PATH', os.path.join(app.root_path, 'snapshots', 'packages'))
+
+def get_package_snapshot():
+    from snapshot import PackageSnapshot  # Imported here so numpy is only needed for snapshots and reports
+    return PackageSnapshot(app.config['SNAPSHOT_PATH'])
+
+@app.cli.command("snapshot-packages")
+def snapshot_packages():
+    """Copy new and changed packages into the local snapshot."""
+    os.makedirs(app.config['SNAPSHOT_PATH'], exist_ok=True)
+    result = get_package_snapshot().refresh(db.session, Package, Client, Recipient)
+    click.echo(f"Copied {result['copied']} and removed {result['removed']} packages in {app.config['SNAPSHOT_PATH']}")
 
 class ClientHistory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -446,8 +470,51 @@ def filter_clients_by_address():
     
     return {"clients": clients_data}
 
+# Route to suggest client and recipient names as the user types
+@app.route("/autocomplete", methods=["GET"])
+def autocomplete():
+    prefix = request.args.get("q", "")
+    kind = request.args.get("type")  # Optional: "client" or "recipient"
+    limit = request.args.get("limit", 10, type=int)
+    if kind and kind not in ("client", "recipient"):
+        return {"error": "type must be 'client' or 'recipient'"}, 400
+
+    try:
+        # Build the index on first use if the app was not started through __main__
+        if not autocomplete_index.built:
+            build_autocomplete_index(db.session)
+        return {"results": autocomplete_index.search(prefix, limit=max(1, min(limit, 50)), kind=kind)}
+    except Exception as e:
+        return {"error": str(e)}
+
+# Route to report the size of the autocomplete index
+@app.route("/autocomplete/stats", methods=["GET"])
+def autocomplete_stats():
+    return autocomplete_index.memory_usage()
+
+# Route for package reports, read from the local snapshot instead of the database
+# e.g. /reports/packages?group_by=category,province&bucket=month&start=2024-01-01
+@app.route("/reports/packages", methods=["GET"])
+def package_report():
+    group_by = [name for name in request.args.get("group_by", "").split(",") if name]
+    bucket = request.args.get("bucket")
+    start = request.args.get("start")
+    end = request.args.get("end")
+
+    package_snapshot = get_package_snapshot()
+    try:
+        results = package_snapshot.report(group_by=group_by, bucket=bucket, start=start, end=end)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    response = {"results": results, "snapshot": package_snapshot.meta()}
+    if bucket:
+        # Packages created before created_at existed can't be placed in a period
+        response["undated_packages"] = package_snapshot.undated_count()
+    return response
+
 if __name__ == "__main__":
-    # Ensure the database tables are created
+    # Ensure the database tables are created and load the autocomplete index
     with app.app_context():
         db.create_all()
+        build_autocomplete_index(db.session)
     app.run(debug=True)
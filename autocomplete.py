@@ -0,0 +1,302 @@
+# autocomplete.py
+# In-memory prefix index used to suggest client and recipient names while staff type
+import bisect  # Binary search over the sorted entry list
+import sys  # Object sizes for memory reporting
+import threading  # Guard the index against concurrent requests
+import unicodedata  # Strip accents when normalizing names
+
+from sqlalchemy import event, inspect  # Session events keep the index current
+from sqlalchemy.orm import Session
+
+
+# Normalize a name: lowercase, remove accents and collapse whitespace ("José  Pérez" -> "jose perez")
+def normalize_name(text):
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(text.casefold().split())
+
+
+# Normalize a phone number: keep digits only ("(305) 555-0101" -> "3055550101")
+def normalize_phone(text):
+    if not text:
+        return ""
+    return "".join(ch for ch in text if ch.isdigit())
+
+
+# Build every key a record can be found by: the full name, each later word of the name, and the phone digits
+def _keys_for(name, phone=None):
+    keys = set()
+    words = normalize_name(name).split(" ")
+    for i in range(len(words)):
+        key = " ".join(words[i:])
+        if key:
+            keys.add(key)
+    digits = normalize_phone(phone)
+    if digits:
+        keys.add(digits)
+    return keys
+
+
+class PrefixIndex:
+    """Sorted array of (key, kind, id) tuples searched with bisect.
+
+    kind is "client" or "recipient". Display values are kept once per record
+    in a dict, so the sorted array only holds short normalized keys.
+    """
+
+    def __init__(self):
+        self._entries = []  # Sorted list of (key, kind, id)
+        self._records = {}  # (kind, id) -> (full_name, contact_number, keys)
+        self._lock = threading.Lock()
+        self._queued = []  # Changes committed while a build is running
+        self.build_lock = threading.Lock()  # Held for a whole build so only one runs at a time
+        self.building = False
+        self.built = False
+
+    def __len__(self):
+        return len(self._entries)
+
+    # Start queueing committed changes; call before the build query runs
+    def start_build(self):
+        with self._lock:
+            self.building = True
+            self._queued = []
+
+    # Stop a failed build without loading anything
+    def cancel_build(self):
+        with self._lock:
+            self.building = False
+            self._queued = []
+
+    # Replace the whole index with the given records: iterable of (kind, id, full_name, contact_number)
+    def load(self, records):
+        entries = []
+        stored = {}
+        for kind, record_id, full_name, contact_number in records:
+            keys = _keys_for(full_name, contact_number)
+            stored[(kind, record_id)] = (full_name, contact_number, keys)
+            entries.extend((key, kind, record_id) for key in keys)
+        entries.sort()
+        with self._lock:
+            self._entries = entries
+            self._records = stored
+            # Replay changes committed while the build query was running
+            for change in self._queued:
+                self._apply_locked(change)
+            self._queued = []
+            self.building = False
+            self.built = True
+
+    # Apply committed changes: iterable of ((kind, id), record or None for a delete)
+    def apply(self, changes):
+        with self._lock:
+            if self.building:
+                self._queued.extend(changes)
+                return
+            if not self.built:
+                return
+            for change in changes:
+                self._apply_locked(change)
+
+    def _apply_locked(self, change):
+        (kind, record_id), record = change
+        self._remove_locked(kind, record_id)
+        if record is not None:
+            self._upsert_locked(*record)
+
+    # Add or update a single record
+    def upsert(self, kind, record_id, full_name, contact_number=None):
+        with self._lock:
+            self._remove_locked(kind, record_id)
+            self._upsert_locked(kind, record_id, full_name, contact_number)
+
+    def _upsert_locked(self, kind, record_id, full_name, contact_number=None):
+        keys = _keys_for(full_name, contact_number)
+        self._records[(kind, record_id)] = (full_name, contact_number, keys)
+        for key in keys:
+            bisect.insort(self._entries, (key, kind, record_id))
+
+    # Remove a single record if present
+    def remove(self, kind, record_id):
+        with self._lock:
+            self._remove_locked(kind, record_id)
+
+    def _remove_locked(self, kind, record_id):
+        record = self._records.pop((kind, record_id), None)
+        if record is None:
+            return
+        for key in record[2]:
+            entry = (key, kind, record_id)
+            pos = bisect.bisect_left(self._entries, entry)
+            if pos < len(self._entries) and self._entries[pos] == entry:
+                del self._entries[pos]
+
+    # Return up to `limit` records whose name (or phone) starts with `prefix`
+    def search(self, prefix, limit=10, kind=None):
+        key = normalize_name(prefix)
+        if not key:
+            return []
+        # Queries made only of phone characters are matched against the digit keys
+        if normalize_phone(key) and not any(ch.isalpha() for ch in key):
+            key = normalize_phone(key)
+
+        results = []
+        seen = set()
+        with self._lock:
+            pos = bisect.bisect_left(self._entries, (key,))
+            while pos < len(self._entries) and len(results) < limit:
+                entry_key, entry_kind, record_id = self._entries[pos]
+                pos += 1
+                if not entry_key.startswith(key):
+                    break
+                if kind and entry_kind != kind:
+                    continue
+                if (entry_kind, record_id) in seen:
+                    continue
+                seen.add((entry_kind, record_id))
+                full_name, contact_number, _ = self._records[(entry_kind, record_id)]
+                results.append({
+                    "type": entry_kind,
+                    "id": record_id,
+                    "full_name": full_name,
+                    "contact_number": contact_number,
+                })
+        return results
+
+    # Approximate memory held by the index, including a per-100k-entries figure
+    def memory_usage(self):
+        with self._lock:
+            total = sys.getsizeof(self._entries) + sys.getsizeof(self._records)
+            for entry in self._entries:
+                total += sys.getsizeof(entry) + sys.getsizeof(entry[0])
+            for record_key, (full_name, contact_number, keys) in self._records.items():
+                total += sys.getsizeof(record_key) + sys.getsizeof(keys)
+                total += sys.getsizeof(full_name) + sys.getsizeof(contact_number)
+            entries = len(self._entries)
+            records = len(self._records)
+        return {
+            "entries": entries,
+            "records": records,
+            "bytes": total,
+            "bytes_per_100k_entries": int(total * 100000 / entries) if entries else 0,
+        }
+
+
+# Shared index used by the /autocomplete routes
+autocomplete_index = PrefixIndex()
+
+# Model classes to index, set by init_autocomplete: kind -> model
+_sources = {}
+
+
+# Return "client" or "recipient" for an indexed model instance, or None
+def _kind_for(instance):
+    for kind, model in _sources.items():
+        if isinstance(instance, model):
+            return kind
+    return None
+
+
+# Turn a model instance into a (kind, id, full_name, contact_number) record, or None if it is not indexed
+def _record_for(instance):
+    kind = _kind_for(instance)
+    if kind is None:
+        return None
+    return kind, instance.id, instance.full_name, getattr(instance, "contact_number", None)
+
+
+# Pending changes are kept in one frame per open transaction level:
+# session.info["autocomplete_pending"] = [[transaction, changes], ...], outermost first.
+# A savepoint's frame is merged into its parent when released and dropped when rolled back;
+# the outermost frame is applied to the index when the transaction commits.
+def _frames(session):
+    return session.info.setdefault("autocomplete_pending", [[None, {}]])
+
+
+def _after_transaction_create(session, transaction):
+    if transaction.nested:
+        _frames(session).append([transaction, {}])
+
+
+# Remember what changed during each flush in the innermost frame
+def _after_flush(session, flush_context):
+    if not _sources:
+        return
+    pending = _frames(session)[-1][1]
+    if pending is None:
+        return
+    for instance in list(session.new) + list(session.dirty):
+        record = _record_for(instance)
+        if record and record[1] is not None:
+            pending[(record[0], record[1])] = record
+    # A delete only needs the key: the row is already gone, so unloaded attributes can't be read
+    for instance in session.deleted:
+        kind = _kind_for(instance)
+        identity = inspect(instance).identity
+        if kind and identity:
+            pending[(kind, identity[0])] = None
+
+
+# Runs for savepoint rollbacks too: drop only the frame of the savepoint being rolled back
+def _after_rollback(session):
+    nested = session.get_nested_transaction()
+    if nested is None:
+        session.info.pop("autocomplete_pending", None)
+        return
+    for frame in _frames(session):
+        if frame[0] is nested:
+            frame[1] = None
+
+
+def _after_transaction_end(session, transaction):
+    if not transaction.nested:
+        return
+    frames = _frames(session)
+    if len(frames) > 1 and frames[-1][0] is transaction:
+        _, changes = frames.pop()
+        if changes is not None and frames[-1][1] is not None:
+            frames[-1][1].update(changes)
+
+
+# Runs for savepoint releases too; only the outermost commit updates the index
+def _after_commit(session):
+    if session.get_nested_transaction() is not None:
+        return
+    frames = session.info.pop("autocomplete_pending", None)
+    if frames and frames[0][1]:
+        autocomplete_index.apply(list(frames[0][1].items()))
+
+
+# Register the models to index and hook the session events that keep the index current
+def init_autocomplete(client_model, recipient_model):
+    _sources["client"] = client_model
+    _sources["recipient"] = recipient_model
+    if not event.contains(Session, "after_flush", _after_flush):
+        event.listen(Session, "after_transaction_create", _after_transaction_create)
+        event.listen(Session, "after_flush", _after_flush)
+        event.listen(Session, "after_rollback", _after_rollback)
+        event.listen(Session, "after_transaction_end", _after_transaction_end)
+        event.listen(Session, "after_commit", _after_commit)
+
+
+# Load every client and recipient into the index (call inside an app context).
+# Commits that land while the query runs are queued and replayed once the load finishes.
+def build_autocomplete_index(session, force=False):
+    client_model = _sources["client"]
+    recipient_model = _sources["recipient"]
+    with autocomplete_index.build_lock:
+        if autocomplete_index.built and not force:
+            return
+        autocomplete_index.start_build()
+        try:
+            records = [("client", row.id, row.full_name, row.contact_number)
+                       for row in session.query(client_model.id, client_model.full_name,
+                                                client_model.contact_number)]
+            records += [("recipient", row.id, row.full_name, None)
+                        for row in session.query(recipient_model.id, recipient_model.full_name)]
+        except Exception:
+            autocomplete_index.cancel_build()
+            raise
+        autocomplete_index.load(records)
@@ -0,0 +1,57 @@
+"""Add timestamps used by the package snapshot
+
+Revision ID: 3f2a9c1d7b64
+Revises:
+Create Date: 2026-10-19 18:00:00.000000
+
+Baseline revision for databases created with db.create_all() before migrations were
+added: it only alters the existing packages, clients and recipients tables. A new, empty
+database should be created with db.create_all() and then marked current with
+`flask db stamp head` instead of running `flask db upgrade`.
+
+Existing packages keep created_at NULL because their real creation time is unknown.
+Bucketed reports leave them out of every period and return them as `undated_packages`.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2a9c1d7b64'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows keep NULL timestamps; the first snapshot refresh copies every package anyway
+    with op.batch_alter_table('packages', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('created_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_packages_created_at'), ['created_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_packages_updated_at'), ['updated_at'], unique=False)
+
+    with op.batch_alter_table('clients', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_clients_updated_at'), ['updated_at'], unique=False)
+
+    with op.batch_alter_table('recipients', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_recipients_updated_at'), ['updated_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('recipients', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_recipients_updated_at'))
+        batch_op.drop_column('updated_at')
+
+    with op.batch_alter_table('clients', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_clients_updated_at'))
+        batch_op.drop_column('updated_at')
+
+    with op.batch_alter_table('packages', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_packages_updated_at'))
+        batch_op.drop_index(batch_op.f('ix_packages_created_at'))
+        batch_op.drop_column('updated_at')
+        batch_op.drop_column('created_at')
@@ -0,0 +1,293 @@
+# snapshot.py
+# Columnar snapshot of packages for offline reporting.
+# The snapshot job copies new and changed packages (with client and recipient fields)
+# into local files; reports then run on those files without querying MySQL.
+import json  # Snapshot metadata
+import os  # File and directory handling
+import shutil  # Remove old snapshot versions
+from datetime import datetime, timedelta  # Watermark timestamps
+
+import numpy as np  # Columnar arrays and group-by aggregation
+
+try:
+    import pyarrow as pa  # Optional: store the snapshot as Parquet
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+# Snapshot columns and their NumPy types (strings are sized when the snapshot is written)
+COLUMNS = {
+    "id": "int64",
+    "created_at": "datetime64[s]",
+    "updated_at": "datetime64[s]",
+    "quantity": "int64",
+    "weight": "float64",
+    "category": "str",
+    "client_id": "int64",
+    "client_name": "str",
+    "recipient_id": "int64",
+    "recipient_name": "str",
+    "municipality": "str",
+    "province": "str",
+}
+
+# Columns a report may group by
+GROUP_COLUMNS = ("category", "client_id", "client_name", "recipient_id", "province", "municipality")
+
+# Time buckets a report may use, as NumPy datetime units
+BUCKETS = {"day": "D", "week": "W", "month": "M", "year": "Y"}
+
+META_FILE = "meta.json"
+
+# Rows changed this long before the last watermark are fetched again. updated_at is set when a
+# row is flushed, not when it commits, so a slow transaction can land behind the watermark.
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+# Changed package ids are fetched with IN lists of at most this many ids
+FETCH_BATCH_SIZE = 1000
+
+
+# Convert a list of Python values into a column array of the given type
+def _to_array(values, dtype):
+    if dtype == "str":
+        return np.array(["" if v is None else str(v) for v in values], dtype=str)
+    if dtype.startswith("datetime64"):
+        return np.array(["NaT" if v is None else v for v in values], dtype=dtype)
+    if dtype == "float64":
+        return np.array([np.nan if v is None else v for v in values], dtype=dtype)
+    return np.array([0 if v is None else v for v in values], dtype=dtype)
+
+
+# True where two columns of the same type hold equal values (missing values compare equal)
+def _same(a, b):
+    if np.issubdtype(a.dtype, np.datetime64):
+        return (a == b) | (np.isnat(a) & np.isnat(b))
+    if np.issubdtype(a.dtype, np.floating):
+        return (a == b) | (np.isnan(a) & np.isnan(b))
+    return a == b
+
+
+# Truncate timestamps to report periods; weeks start on Monday
+def _bucket(created_at, bucket):
+    if bucket == "week":
+        # NumPy weeks start on Thursday (1970-01-01 was a Thursday), so shift by 3 days to start on Monday
+        shift = np.timedelta64(3, "D")
+        return (created_at + shift).astype("datetime64[W]").astype("datetime64[D]") - shift
+    return created_at.astype(f"datetime64[{BUCKETS[bucket]}]")
+
+
+class PackageSnapshot:
+    """Package snapshot stored under `path`.
+
+    Each refresh writes a new version directory (Parquet if pyarrow is installed,
+    otherwise one .npy file per column) and then points meta.json at it, so readers
+    never see a half-written snapshot. The version it replaces is kept until the next
+    refresh, so a reader that already read the old meta.json can still open its files.
+    """
+
+    def __init__(self, path, use_parquet=None):
+        self.path = path
+        self.use_parquet = (pq is not None) if use_parquet is None else use_parquet
+        if self.use_parquet and pq is None:
+            raise RuntimeError("pyarrow is required for Parquet snapshots")
+
+    # Read meta.json, or return an empty dict if there is no snapshot yet
+    def meta(self):
+        try:
+            with open(os.path.join(self.path, META_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    # Load the snapshot columns as a dict of NumPy arrays (empty arrays if there is no snapshot)
+    def load(self):
+        meta = self.meta()
+        if not meta:
+            return {name: _to_array([], dtype) for name, dtype in COLUMNS.items()}
+
+        version_dir = os.path.join(self.path, meta["version"])
+        if meta["format"] == "parquet":
+            if pq is None:
+                raise RuntimeError("pyarrow is required to read this snapshot")
+            table = pq.read_table(os.path.join(version_dir, "packages.parquet"), memory_map=True)
+            return {name: table.column(name).to_numpy() for name in COLUMNS}
+
+        # NumPy columns are memory-mapped, so only the pages a report touches are read
+        return {name: np.load(os.path.join(version_dir, f"{name}.npy"), mmap_mode="r")
+                for name in COLUMNS}
+
+    # Load the snapshot with every column in its snapshot type, ready to compare and merge
+    def _load_typed(self):
+        return {name: np.asarray(values).astype(str if COLUMNS[name] == "str" else COLUMNS[name])
+                for name, values in self.load().items()}
+
+    # Bring the snapshot up to date: copy new and changed packages (including ones whose client or
+    # recipient changed) and drop deleted ones. Returns {"copied": n, "removed": n}.
+    def refresh(self, session, package_model, client_model, recipient_model):
+        meta = self.meta()
+        watermark = meta.get("watermark")
+        max_id = meta.get("max_id", 0)
+
+        query = (session.query(
+                    package_model.id, package_model.created_at, package_model.updated_at,
+                    package_model.quantity, package_model.weight, package_model.category,
+                    package_model.client_id, client_model.full_name,
+                    package_model.recipient_id, recipient_model.full_name,
+                    recipient_model.municipality, recipient_model.province,
+                    client_model.updated_at, recipient_model.updated_at)
+                 .join(client_model, package_model.client_id == client_model.id)
+                 .join(recipient_model, package_model.recipient_id == recipient_model.id))
+        if watermark:
+            # Ids of packages whose package, client or recipient changed since the last run (with
+            # overlap), plus new rows created without a timestamp. Each lookup is its own query so
+            # MySQL can use the updated_at indexes; one OR across the joined tables scans them all.
+            since = datetime.fromisoformat(watermark) - WATERMARK_OVERLAP
+            changed_ids = {row[0] for row in session.query(package_model.id).filter(
+                (package_model.updated_at >= since) | (package_model.id > max_id))}
+            changed_ids.update(row[0] for row in session.query(package_model.id)
+                               .join(client_model, package_model.client_id == client_model.id)
+                               .filter(client_model.updated_at >= since))
+            changed_ids.update(row[0] for row in session.query(package_model.id)
+                               .join(recipient_model, package_model.recipient_id == recipient_model.id)
+                               .filter(recipient_model.updated_at >= since))
+            changed_ids = sorted(changed_ids)
+            rows = []
+            for i in range(0, len(changed_ids), FETCH_BATCH_SIZE):
+                batch = changed_ids[i:i + FETCH_BATCH_SIZE]
+                rows += query.filter(package_model.id.in_(batch)).order_by(package_model.id).all()
+        else:
+            rows = query.order_by(package_model.id).all()
+
+        # Every package id is read on each run so deletes can be detected; this is an
+        # index-only scan of the primary key
+        live_ids = np.array([row[0] for row in session.query(package_model.id)], dtype="int64")
+
+        current = self._load_typed()
+        fetched = {name: _to_array([row[i] for row in rows], dtype)
+                   for i, (name, dtype) in enumerate(COLUMNS.items())}
+
+        # Only rows that are new or differ from the snapshot count as changed
+        changed = np.ones(len(rows), dtype=bool)
+        if len(current["id"]) and len(rows):
+            order = np.argsort(current["id"])
+            pos = order[np.minimum(np.searchsorted(current["id"], fetched["id"], sorter=order),
+                                   len(order) - 1)]
+            same = current["id"][pos] == fetched["id"]
+            for name in COLUMNS:
+                same &= _same(current[name][pos], fetched[name])
+            changed = ~same
+
+        deleted = ~np.isin(current["id"], live_ids)
+        copied, removed = int(changed.sum()), int(deleted.sum())
+        if meta and not copied and not removed:
+            return {"copied": 0, "removed": 0}
+
+        # Keep the snapshot rows that were neither changed nor deleted, then add the changed ones
+        keep = ~deleted & ~np.isin(current["id"], fetched["id"][changed])
+        columns = {name: np.concatenate([current[name][keep], fetched[name][changed]])
+                   for name in COLUMNS}
+        order = np.argsort(columns["id"], kind="stable")
+        columns = {name: values[order] for name, values in columns.items()}
+
+        # Keep the watermark at full precision; the snapshot columns are truncated to seconds
+        updated = [value for row in rows for value in (row[2], row[12], row[13]) if value is not None]
+        if watermark:
+            updated.append(datetime.fromisoformat(watermark))
+        new_meta = {
+            "version": datetime.utcnow().strftime("v%Y%m%d%H%M%S%f"),
+            "format": "parquet" if self.use_parquet else "numpy",
+            "rows": int(len(columns["id"])),
+            "max_id": max(int(columns["id"].max()) if len(columns["id"]) else 0, max_id),
+            "watermark": max(updated).isoformat() if updated else None,
+            "refreshed_at": datetime.utcnow().isoformat(timespec="seconds"),
+        }
+        self._write(columns, new_meta)
+        self._remove_old_versions(keep={new_meta["version"], meta.get("version")})
+        return {"copied": copied, "removed": removed}
+
+    # Delete version directories other than the current one and the one it just replaced
+    def _remove_old_versions(self, keep):
+        for name in os.listdir(self.path):
+            path = os.path.join(self.path, name)
+            if name.startswith("v") and name not in keep and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _write(self, columns, meta):
+        version_dir = os.path.join(self.path, meta["version"])
+        os.makedirs(version_dir)
+        if meta["format"] == "parquet":
+            table = pa.table({name: columns[name] for name in COLUMNS})
+            pq.write_table(table, os.path.join(version_dir, "packages.parquet"))
+        else:
+            for name in COLUMNS:
+                np.save(os.path.join(version_dir, f"{name}.npy"), columns[name])
+
+        # Switch readers to the new version in one step
+        tmp_meta = os.path.join(self.path, META_FILE + ".tmp")
+        with open(tmp_meta, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_meta, os.path.join(self.path, META_FILE))
+
+    # Number of packages with no created_at (rows that existed before the column was added)
+    def undated_count(self):
+        return int(np.isnat(np.asarray(self.load()["created_at"])).sum())
+
+    # Count packages, total quantity and total weight grouped by columns and/or a time bucket.
+    # Packages without created_at are left out of bucketed reports; see undated_count().
+    def report(self, group_by=(), bucket=None, start=None, end=None):
+        for name in group_by:
+            if name not in GROUP_COLUMNS:
+                raise ValueError(f"Cannot group by '{name}'")
+        if bucket and bucket not in BUCKETS:
+            raise ValueError(f"Unknown bucket '{bucket}'")
+
+        columns = self.load()
+        created_at = np.asarray(columns["created_at"]).astype("datetime64[s]")
+
+        # Optional date range on created_at
+        mask = np.ones(len(created_at), dtype=bool)
+        if start:
+            mask &= created_at >= np.datetime64(start, "s")
+        if end:
+            mask &= created_at < np.datetime64(end, "s")
+        if bucket:
+            mask &= ~np.isnat(created_at)
+
+        keys = [(name, np.asarray(columns[name])[mask]) for name in group_by]
+        if bucket:
+            keys.append(("period", _bucket(created_at[mask], bucket)))
+        quantity = np.asarray(columns["quantity"])[mask]
+        weight = np.nan_to_num(np.asarray(columns["weight"])[mask])
+
+        if not keys:
+            return [{"packages": int(mask.sum()), "quantity": int(quantity.sum()),
+                     "weight": float(weight.sum())}]
+
+        # Encode each key column as integer codes, then combine them into one group code
+        uniques, codes = [], []
+        for _, values in keys:
+            unique_values, inverse = np.unique(values, return_inverse=True)
+            uniques.append(unique_values)
+            codes.append(inverse.ravel())
+        if len(quantity) == 0:
+            return []
+        group_code = np.ravel_multi_index(codes, [len(u) for u in uniques])
+        groups, group_index = np.unique(group_code, return_inverse=True)
+        group_index = group_index.ravel()
+
+        counts = np.bincount(group_index)
+        quantities = np.bincount(group_index, weights=quantity)
+        weights = np.bincount(group_index, weights=weight)
+
+        results = []
+        for g, parts in enumerate(zip(*np.unravel_index(groups, [len(u) for u in uniques]))):
+            row = {name: getattr(value, "item", lambda: value)()
+                   for (name, _), value in zip(keys, (u[p] for u, p in zip(uniques, parts)))}
+            if bucket:
+                row["period"] = str(uniques[-1][parts[-1]])
+            row.update({"packages": int(counts[g]), "quantity": int(quantities[g]),
+                        "weight": float(weights[g])})
+            results.append(row)
+        return results
@@ -0,0 +1,6 @@
+# tests/conftest.py
+# Make the top-level modules (autocomplete.py, snapshot.py) importable from the tests
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
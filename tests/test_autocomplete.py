@@ -0,0 +1,178 @@
+# tests/test_autocomplete.py
+# Tests for the in-memory autocomplete index and the session events that keep it current
+import random
+import string
+import threading
+import time
+
+import pytest
+from sqlalchemy import Column, Integer, String, create_engine
+from sqlalchemy.orm import Session, declarative_base, load_only
+
+import autocomplete
+from autocomplete import PrefixIndex, build_autocomplete_index, init_autocomplete
+
+Base = declarative_base()
+
+
+class Client(Base):
+    __tablename__ = 'clients'
+    id = Column(Integer, primary_key=True)
+    full_name = Column(String(100), nullable=False)
+    contact_number = Column(String(20))
+
+
+class Recipient(Base):
+    __tablename__ = 'recipients'
+    id = Column(Integer, primary_key=True)
+    full_name = Column(String(100), nullable=False)
+
+
+@pytest.fixture
+def session(monkeypatch):
+    monkeypatch.setattr(autocomplete, "autocomplete_index", PrefixIndex())
+    init_autocomplete(Client, Recipient)
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all([
+            Client(full_name="José Pérez", contact_number="(305) 555-0101"),
+            Recipient(full_name="Maria Garcia"),
+        ])
+        session.commit()
+        build_autocomplete_index(session)
+        yield session
+
+
+def names(prefix, **kwargs):
+    return [r["full_name"] for r in autocomplete.autocomplete_index.search(prefix, **kwargs)]
+
+
+def test_search_normalizes_accents_and_matches_later_words(session):
+    assert names("jose") == ["José Pérez"]
+    assert names("  PEREZ") == ["José Pérez"]
+    assert names("gar") == ["Maria Garcia"]
+    assert names("gar", kind="client") == []
+
+
+def test_phone_prefix_lookup(session):
+    assert names("305") == ["José Pérez"]
+    assert names("(305) 55") == ["José Pérez"]
+    assert names("306") == []
+
+
+def test_search_respects_limit_and_deduplicates(session):
+    session.add_all([Client(full_name=f"Ana Ana {i}") for i in range(5)])
+    session.commit()
+    results = autocomplete.autocomplete_index.search("ana", limit=3)
+    assert len(results) == 3
+    assert len({r["id"] for r in results}) == 3
+
+
+def test_commit_updates_index(session):
+    client = Client(full_name="Joana Diaz")
+    session.add(client)
+    session.commit()
+    assert names("jo") == ["Joana Diaz", "José Pérez"]
+
+    client.full_name = "Zoe Diaz"
+    session.commit()
+    assert names("jo") == ["José Pérez"]
+    assert names("zoe") == ["Zoe Diaz"]
+
+    session.delete(client)
+    session.commit()
+    assert names("zoe") == []
+    assert names("diaz") == []
+
+
+def test_delete_of_partially_loaded_instance(session):
+    client_id = session.query(Client.id).scalar()
+    session.expunge_all()
+    client = session.get(Client, client_id, options=[load_only(Client.id)])
+    session.delete(client)
+    session.commit()
+    assert names("jose") == []
+    assert names("305") == []
+
+
+def test_rollback_discards_flushed_changes(session):
+    session.add(Client(full_name="Rolled Back"))
+    session.flush()
+    session.rollback()
+    assert names("rolled") == []
+
+
+def test_savepoint_rollback_keeps_outer_changes(session):
+    session.add(Client(full_name="Outer Person"))
+    session.flush()
+    savepoint = session.begin_nested()
+    session.add(Client(full_name="Inner Person"))
+    session.flush()
+    savepoint.rollback()
+    session.commit()
+    assert names("outer") == ["Outer Person"]
+    assert names("inner") == []
+
+
+def test_released_savepoint_is_applied_on_commit(session):
+    with session.begin_nested():
+        session.add(Recipient(full_name="Nested Recipient"))
+    assert names("nested") == []
+    session.commit()
+    assert names("nested") == ["Nested Recipient"]
+
+
+def test_commits_during_build_are_replayed(session, monkeypatch):
+    index = PrefixIndex()
+    monkeypatch.setattr(autocomplete, "autocomplete_index", index)
+    index.start_build()
+    session.add(Client(full_name="During Build"))
+    session.commit()
+    index.load([("client", 1, "José Pérez", None)])
+    assert names("during") == ["During Build"]
+
+
+class SlowSession:
+    """Stands in for a session whose build query takes a while."""
+
+    def query(self, *columns):
+        time.sleep(0.05)
+        return []
+
+
+def test_concurrent_builds_run_once(monkeypatch):
+    monkeypatch.setattr(autocomplete, "autocomplete_index", PrefixIndex())
+    init_autocomplete(Client, Recipient)
+    loads = []
+    original_load = PrefixIndex.load
+    monkeypatch.setattr(PrefixIndex, "load", lambda self, records: (loads.append(1), original_load(self, records)))
+    threads = [threading.Thread(target=build_autocomplete_index, args=(SlowSession(),)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert loads == [1]
+    assert autocomplete.autocomplete_index.built
+
+
+def test_search_speed_and_memory_per_100k_entries():
+    rng = random.Random(0)
+    index = PrefixIndex()
+    index.load([
+        ("client", i, "".join(rng.choices(string.ascii_lowercase, k=8)) + " " +
+         "".join(rng.choices(string.ascii_lowercase, k=8)), str(rng.randrange(10 ** 9)))
+        for i in range(34000)
+    ])
+    assert len(index) >= 100000
+
+    runs = 2000
+    start = time.perf_counter()
+    for _ in range(runs):
+        index.search("ab", limit=10)
+    per_search = (time.perf_counter() - start) / runs
+    assert per_search < 0.001  # Well under a millisecond per top-10 lookup
+
+    usage = index.memory_usage()
+    assert usage["entries"] == len(index)
+    assert 0 < usage["bytes_per_100k_entries"] < 100 * 1024 * 1024
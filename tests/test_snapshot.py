@@ -0,0 +1,204 @@
+# tests/test_snapshot.py
+# Tests for the columnar package snapshot and its reports
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, String, create_engine
+from sqlalchemy.orm import Session, declarative_base
+
+pytest.importorskip("numpy")
+import snapshot  # noqa: E402
+from snapshot import PackageSnapshot  # noqa: E402
+
+Base = declarative_base()
+
+
+class Client(Base):
+    __tablename__ = 'clients'
+    id = Column(Integer, primary_key=True)
+    full_name = Column(String(100), nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class Recipient(Base):
+    __tablename__ = 'recipients'
+    id = Column(Integer, primary_key=True)
+    full_name = Column(String(100), nullable=False)
+    municipality = Column(String(100))
+    province = Column(String(100))
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class Package(Base):
+    __tablename__ = 'packages'
+    id = Column(Integer, primary_key=True)
+    quantity = Column(Integer, nullable=False)
+    weight = Column(Float)
+    category = Column(String(50))
+    client_id = Column(Integer, ForeignKey('clients.id'), nullable=False)
+    recipient_id = Column(Integer, ForeignKey('recipients.id'), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+@pytest.fixture(params=["numpy", "parquet"])
+def snap(request, tmp_path):
+    if request.param == "parquet" and snapshot.pq is None:
+        pytest.skip("pyarrow is not installed")
+    return PackageSnapshot(str(tmp_path), use_parquet=request.param == "parquet")
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all([
+            Client(id=1, full_name="Ana Lopez"),
+            Client(id=2, full_name="Pedro Ruiz"),
+            Recipient(id=1, full_name="Luis", municipality="Playa", province="Havana"),
+            Recipient(id=2, full_name="Eva", municipality="Cardenas", province="Holguin"),
+        ])
+        session.add_all([
+            Package(quantity=2, weight=1.5, category="food", client_id=1, recipient_id=1,
+                    created_at=datetime(2024, 1, 5)),
+            Package(quantity=1, weight=None, category="meds", client_id=1, recipient_id=2,
+                    created_at=datetime(2024, 1, 8)),
+            Package(quantity=4, weight=2.0, category="food", client_id=2, recipient_id=2,
+                    created_at=datetime(2024, 2, 20)),
+        ])
+        session.commit()
+        yield session
+
+
+def refresh(snap, session):
+    return snap.refresh(session, Package, Client, Recipient)
+
+
+def test_first_refresh_copies_everything(snap, session):
+    assert refresh(snap, session) == {"copied": 3, "removed": 0}
+    assert snap.meta()["rows"] == 3
+    assert list(snap.load()["id"]) == [1, 2, 3]
+
+
+def test_refresh_without_changes_writes_nothing(snap, session):
+    refresh(snap, session)
+    version = snap.meta()["version"]
+    assert refresh(snap, session) == {"copied": 0, "removed": 0}
+    assert snap.meta()["version"] == version
+
+
+def test_refresh_copies_new_and_updated_packages(snap, session):
+    refresh(snap, session)
+    session.get(Package, 1).category = "clothes"
+    session.add(Package(quantity=9, category="food", client_id=2, recipient_id=1))
+    session.commit()
+
+    assert refresh(snap, session) == {"copied": 2, "removed": 0}
+    assert snap.report(group_by=["category"]) == [
+        {"category": "clothes", "packages": 1, "quantity": 2, "weight": 1.5},
+        {"category": "food", "packages": 2, "quantity": 13, "weight": 2.0},
+        {"category": "meds", "packages": 1, "quantity": 1, "weight": 0.0},
+    ]
+
+
+def test_refresh_fetches_changed_ids_in_batches(snap, session, monkeypatch):
+    refresh(snap, session)
+    monkeypatch.setattr(snapshot, "FETCH_BATCH_SIZE", 2)
+    for package in session.query(Package):
+        package.quantity += 10
+    session.commit()
+
+    assert refresh(snap, session) == {"copied": 3, "removed": 0}
+    assert snap.report() == [{"packages": 3, "quantity": 37, "weight": 3.5}]
+
+
+def test_refresh_removes_deleted_packages(snap, session):
+    refresh(snap, session)
+    session.delete(session.get(Package, 2))
+    session.commit()
+
+    assert refresh(snap, session) == {"copied": 0, "removed": 1}
+    assert list(snap.load()["id"]) == [1, 3]
+    assert snap.report() == [{"packages": 2, "quantity": 6, "weight": 3.5}]
+
+
+def test_refresh_picks_up_recipient_and_client_changes(snap, session):
+    refresh(snap, session)
+    session.get(Recipient, 2).province = "Granma"
+    session.get(Client, 1).full_name = "Ana Lopez Diaz"
+    session.commit()
+
+    assert refresh(snap, session) == {"copied": 3, "removed": 0}
+    assert [row["province"] for row in snap.report(group_by=["province"])] == ["Granma", "Havana"]
+    assert "Ana Lopez Diaz" in [row["client_name"] for row in snap.report(group_by=["client_name"])]
+
+
+def test_refresh_keeps_the_replaced_version_for_one_more_run(snap, session):
+    refresh(snap, session)
+    versions = [snap.meta()["version"]]
+    for quantity in (20, 30):
+        session.get(Package, 1).quantity = quantity
+        session.commit()
+        refresh(snap, session)
+        versions.append(snap.meta()["version"])
+
+    # The first version is gone; the one replaced last is still readable
+    assert sorted(name for name in os.listdir(snap.path) if name.startswith("v")) == versions[1:]
+
+
+def test_refresh_catches_changes_committed_behind_the_watermark(snap, session):
+    refresh(snap, session)
+    # A transaction that flushed before the last refresh but committed after it
+    package = session.get(Package, 3)
+    package.quantity = 40
+    session.flush()
+    package.updated_at = datetime.fromisoformat(snap.meta()["watermark"]) - timedelta(minutes=1)
+    session.commit()
+
+    assert refresh(snap, session) == {"copied": 1, "removed": 0}
+    assert snap.report() == [{"packages": 3, "quantity": 43, "weight": 3.5}]
+
+
+def test_report_groups_by_columns_and_month(snap, session):
+    refresh(snap, session)
+    assert snap.report(group_by=["province"], bucket="month") == [
+        {"province": "Havana", "period": "2024-01", "packages": 1, "quantity": 2, "weight": 1.5},
+        {"province": "Holguin", "period": "2024-01", "packages": 1, "quantity": 1, "weight": 0.0},
+        {"province": "Holguin", "period": "2024-02", "packages": 1, "quantity": 4, "weight": 2.0},
+    ]
+    assert snap.report(group_by=["client_id"], start="2024-01-06", end="2024-02-01") == [
+        {"client_id": 1, "packages": 1, "quantity": 1, "weight": 0.0},
+    ]
+
+
+def test_report_weeks_start_on_monday(snap, session):
+    refresh(snap, session)
+    # 2024-01-05 is a Friday and 2024-01-08 the following Monday
+    assert [row["period"] for row in snap.report(bucket="week")] == ["2024-01-01", "2024-01-08", "2024-02-19"]
+
+
+def test_bucketed_report_leaves_out_undated_packages(snap, session):
+    session.add(Package(quantity=5, category="food", client_id=1, recipient_id=1))
+    session.flush()
+    session.query(Package).filter(Package.quantity == 5).update({"created_at": None})
+    session.commit()
+    refresh(snap, session)
+
+    assert [row["period"] for row in snap.report(bucket="month")] == ["2024-01", "2024-02"]
+    assert snap.undated_count() == 1
+    assert snap.report() == [{"packages": 4, "quantity": 12, "weight": 3.5}]
+
+
+def test_report_rejects_unknown_columns_and_buckets(snap, session):
+    refresh(snap, session)
+    with pytest.raises(ValueError):
+        snap.report(group_by=["description"])
+    with pytest.raises(ValueError):
+        snap.report(bucket="hour")
+
+
+def test_report_on_empty_snapshot(snap):
+    assert snap.report() == [{"packages": 0, "quantity": 0, "weight": 0.0}]
+    assert snap.report(group_by=["category"]) == []